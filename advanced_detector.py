@@ -6,78 +6,164 @@ LeechCore高级检测模块
 - 历史对比分析
 """
 
+import os
+import ctypes
 import psutil
-import numpy as np
-from collections import defaultdict, deque
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import logging
-import subprocess
 import re
 
+try:
+    import numpy as np
+    _HAVE_NP = True
+except ImportError:
+    # numpy为可选依赖，缺失时使用纯Python实现
+    np = None
+    _HAVE_NP = False
+
 logger = logging.getLogger(__name__)
 
 
 class MemoryAnomalyDetector:
     """内存异常检测 - 检测可能的内存读取操作"""
     
+    # 内存占用阈值（百分比）
+    MEMORY_PERCENT_THRESHOLD = 30
+    
     def __init__(self):
-        self.memory_access_patterns = defaultdict(deque)
-        self.baseline_memory = {}
+        # pid -> Process，跨扫描复用进程对象
+        self._proc_cache = {}
     
-    def get_process_memory_info(self, pid):
-        """获取进程内存信息"""
-        try:
+    def _get_process(self, pid):
+        """获取缓存的进程对象，PID被复用时重新创建"""
+        proc = self._proc_cache.get(pid)
+        # is_running()会比对创建时间，可识别PID复用
+        if proc is None or not proc.is_running():
             proc = psutil.Process(pid)
-            return {
-                'pid': pid,
-                'name': proc.name(),
-                'rss': proc.memory_info().rss,  # 物理内存
-                'vms': proc.memory_info().vms,  # 虚拟内存
-                'memory_percent': proc.memory_percent(),
-                'page_faults': proc.memory_info().pfn if hasattr(proc.memory_info(), 'pfn') else None
-            }
+            self._proc_cache[pid] = proc
+        return proc
+    
+    def get_process_memory_info(self, pid, proc=None):
+        """获取进程内存信息
+        
+        Args:
+            pid: 进程ID
+            proc: 可选，已有的psutil.Process对象（如process_iter返回的），避免重复创建
+        """
+        try:
+            if proc is None:
+                proc = self._get_process(pid)
+            # oneshot() 合并底层系统调用，memory_info 只取一次
+            with proc.oneshot():
+                mem = proc.memory_info()
+                return {
+                    'pid': pid,
+                    'name': proc.name(),
+                    'rss': mem.rss,  # 物理内存
+                    'vms': mem.vms,  # 虚拟内存
+                    'memory_percent': proc.memory_percent(),
+                    'page_faults': getattr(mem, 'pfn', None)
+                }
+        except psutil.NoSuchProcess:
+            self._proc_cache.pop(pid, None)
+            return None
         except Exception as e:
-            logger.error(f"获取进程 {pid} 内存信息失败: {e}")
+            logger.error("获取进程 %s 内存信息失败: %s", pid, e)
             return None
     
-    def detect_memory_access_anomalies(self):
-        """检测异常的内存访问行为"""
+    def _collect_memory_usage(self, snapshot=None):
+        """采集所有进程的内存占用
+        
+        Args:
+            snapshot: 可选，ComprehensiveDetector采集的系统快照，提供时不再枚举进程
+        
+        Returns:
+            (pids, rss, vms, procs)：前三项为int64数组（无numpy时为列表），procs为对应的Process对象（Linux下可能为None）
+        """
+        found, rss, vms, procs = [], [], [], []
+        
+        if snapshot is None and psutil.LINUX:
+            # 直接读取 /proc/[pid]/statm，不创建psutil对象
+            page_size = os.sysconf('SC_PAGE_SIZE')
+            for pid in psutil.pids():
+                try:
+                    with open(f'/proc/{pid}/statm', 'rb') as f:
+                        fields = f.read().split()
+                    vms_pages, rss_pages = int(fields[0]), int(fields[1])
+                except (OSError, IndexError, ValueError):
+                    continue
+                found.append(pid)
+                rss.append(rss_pages * page_size)
+                vms.append(vms_pages * page_size)
+                procs.append(None)
+        else:
+            if snapshot is not None:
+                source = snapshot['procs']
+            else:
+                source = ((p, p.info) for p in psutil.process_iter(['memory_info']))
+            for proc, info in source:
+                mem = info['memory_info']
+                if mem is None:
+                    continue
+                found.append(proc.pid)
+                rss.append(mem.rss)
+                vms.append(mem.vms)
+                procs.append(proc)
+        
+        if not _HAVE_NP:
+            return found, rss, vms, procs
+        
+        return (
+            np.array(found, dtype=np.int64),
+            np.array(rss, dtype=np.int64),
+            np.array(vms, dtype=np.int64),
+            procs
+        )
+    
+    def detect_memory_access_anomalies(self, snapshot=None):
+        """检测异常的内存访问行为
+        
+        Args:
+            snapshot: 可选，本次扫描的系统快照，避免重复枚举进程
+        """
         anomalies = []
         
         try:
-            # 检查具有高内存占用的进程
-            for proc in psutil.process_iter(['pid', 'name', 'memory_percent']):
-                try:
-                    if proc.info['memory_percent'] > 30:  # 占用超过30%
-                        # 获取详细信息
-                        mem_info = self.get_process_memory_info(proc.info['pid'])
-                        if mem_info:
-                            # 检查是否是可疑进程
-                            if self._is_suspicious_memory_usage(mem_info):
-                                anomalies.append({
-                                    'type': 'high_memory_usage',
-                                    'process': mem_info,
-                                    'severity': 'medium'
-                                })
-                
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    pass
+            pids, rss, vms, procs = self._collect_memory_usage(snapshot)
+            memory = snapshot['memory'] if snapshot is not None else psutil.virtual_memory()
+            limit = memory.total * self.MEMORY_PERCENT_THRESHOLD / 100
+            
+            # 一次向量化比较筛出高内存占用且内存使用可疑的进程，只对命中者获取详细信息
+            if _HAVE_NP:
+                hits = np.flatnonzero((rss > limit) & self._suspicious_memory_mask(rss, vms))
+            else:
+                hits = [
+                    i for i in range(len(pids))
+                    if rss[i] > limit and self._suspicious_memory_mask(rss[i], vms[i])
+                ]
+            for idx in hits:
+                mem_info = self.get_process_memory_info(int(pids[idx]), procs[idx])
+                if mem_info:
+                    anomalies.append({
+                        'type': 'high_memory_usage',
+                        'process': mem_info,
+                        'severity': 'medium'
+                    })
         
         except Exception as e:
-            logger.error(f"检测内存异常失败: {e}")
+            logger.error("检测内存异常失败: %s", e)
         
         return anomalies
     
-    def _is_suspicious_memory_usage(self, mem_info):
-        """判断内存使用是否可疑"""
+    @staticmethod
+    def _suspicious_memory_mask(rss, vms):
+        """判断内存使用是否可疑（数组逐元素或单个数值）"""
         # 可疑特征：
         # 1. 内存占用异常高但不是常见应用
         # 2. 虚拟内存远大于物理内存
-        
-        if mem_info['vms'] > mem_info['rss'] * 3:
-            return True
-        
-        return False
+        return vms > rss * 3
 
 
 class DriverBehaviorAnalyzer:
@@ -95,64 +181,79 @@ class DriverBehaviorAnalyzer:
         'pciebar',
     ]
     
+    @staticmethod
+    def _enum_device_drivers():
+        """通过 psapi.EnumDeviceDrivers 枚举已加载的内核驱动名称（仅Windows）"""
+        psapi = ctypes.WinDLL('psapi')
+        psapi.EnumDeviceDrivers.argtypes = [
+            ctypes.POINTER(ctypes.c_void_p), ctypes.c_ulong, ctypes.POINTER(ctypes.c_ulong)
+        ]
+        psapi.GetDeviceDriverBaseNameW.argtypes = [
+            ctypes.c_void_p, ctypes.c_wchar_p, ctypes.c_ulong
+        ]
+        
+        needed = ctypes.c_ulong()
+        drivers = (ctypes.c_void_p * 1024)()
+        while True:
+            if not psapi.EnumDeviceDrivers(drivers, ctypes.sizeof(drivers), ctypes.byref(needed)):
+                raise ctypes.WinError()
+            count = needed.value // ctypes.sizeof(ctypes.c_void_p)
+            if count <= len(drivers):
+                break
+            # 缓冲区不足，按实际需要重新分配
+            drivers = (ctypes.c_void_p * count)()
+        
+        names = set()
+        name_buf = ctypes.create_unicode_buffer(260)
+        for base in drivers[:count]:
+            if base and psapi.GetDeviceDriverBaseNameW(base, name_buf, len(name_buf)):
+                names.add(name_buf.value)
+        return names
+    
     @staticmethod
     def scan_loaded_drivers():
         """扫描已加载的驱动程序"""
         suspicious_drivers = []
         
         try:
-            # Windows特定的驱动扫描
-            result = subprocess.run(
-                ['wmic', 'sysdriver', 'list', 'brief'],
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
-            
-            if result.returncode == 0:
-                lines = result.stdout.strip().split('\n')
-                for line in lines[1:]:
-                    if line.strip():
-                        # 提取驱动程序名称
-                        parts = line.split()
-                        if parts:
-                            driver_name = parts[0].lower()
-                            for suspicious in DriverBehaviorAnalyzer.SUSPICIOUS_DRIVERS:
-                                if suspicious in driver_name:
-                                    suspicious_drivers.append({
-                                        'name': parts[0],
-                                        'status': 'loaded',
-                                        'severity': 'critical'
-                                    })
-                                    logger.warning(f"🚨 检测到可疑驱动程序: {parts[0]}")
+            # Windows特定的驱动扫描（直接调用WinAPI枚举）
+            for driver_name in sorted(DriverBehaviorAnalyzer._enum_device_drivers()):
+                if _DRIVER_RE.search(driver_name):
+                    suspicious_drivers.append({
+                        'name': driver_name,
+                        'status': 'loaded',
+                        'severity': 'critical'
+                    })
+                    logger.warning("🚨 检测到可疑驱动程序: %s", driver_name)
         
         except Exception as e:
-            logger.warning(f"扫描驱动程序失败: {e}")
+            logger.warning("扫描驱动程序失败: %s", e)
         
         return suspicious_drivers
     
     @staticmethod
     def check_kernel_mode_execution():
-        """检查是否有内核模式执行"""
+        """检查是否有内核模式执行，返回以SYSTEM身份运行的进程列表"""
         try:
             # 检查是否有异常的内核模式进程
-            result = subprocess.run(
-                ['tasklist', '/v'],
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
-            
-            if result.returncode == 0:
-                # 分析进程列表中的异常
-                return result.stdout
+            return [
+                dict(p.info) for p in psutil.process_iter(['pid', 'name', 'username'])
+                if (p.info['username'] or '').endswith('SYSTEM')
+            ]
         
         except Exception as e:
-            logger.error(f"检查内核模式执行失败: {e}")
+            logger.error("检查内核模式执行失败: %s", e)
         
         return None
 
 
+# 所有可疑驱动特征合并为一个预编译模式（忽略大小写），每个驱动名只需一次扫描
+_DRIVER_RE = re.compile(
+    '|'.join(re.escape(s) for s in DriverBehaviorAnalyzer.SUSPICIOUS_DRIVERS),
+    re.IGNORECASE
+)
+
+
 class NetworkFingerprinting:
     """网络指纹识别 - 识别LeechCore的通讯模式"""
     
@@ -181,33 +282,123 @@ class NetworkFingerprinting:
         
         # 检查可疑的端口范围
         remote_port = fingerprint['remote_port']
-        if remote_port:
-            for start, end in NetworkFingerprinting.LEECHCORE_SIGNATURES['port_ranges']:
-                if start <= remote_port <= end:
-                    fingerprint['indicators'].append('suspicious_port_range')
+        if remote_port and _PORT_MASK[remote_port >> 3] & (1 << (remote_port & 7)):
+            fingerprint['indicators'].append('suspicious_port_range')
         
         # 检查状态
         if connection.status == 'ESTABLISHED':
             fingerprint['indicators'].append('established_connection')
         
         return fingerprint
+    
+    @staticmethod
+    def select_candidates(connections):
+        """批量筛选可能带有指纹特征的远程连接（可疑端口或已建立状态）"""
+        remote = [c for c in connections if c.raddr]
+        if not remote:
+            return []
+        
+        if not _HAVE_NP:
+            return [
+                c for c in remote
+                if c.status == 'ESTABLISHED' or _PORT_MASK[c.raddr[1] >> 3] & (1 << (c.raddr[1] & 7))
+            ]
+        
+        ports = np.fromiter((c.raddr[1] for c in remote), dtype=np.uint16, count=len(remote))
+        established = np.fromiter(
+            (c.status == 'ESTABLISHED' for c in remote), dtype=bool, count=len(remote)
+        )
+        # 向量化查询端口位图
+        port_hits = (_PORT_BITMAP[ports >> 3] & (1 << (ports & 7))) != 0
+        return [remote[i] for i in np.flatnonzero(port_hits | established)]
+
+
+def _build_port_mask(port_ranges):
+    """构建65536位的端口位图，每个端口一位"""
+    mask = bytearray(8192)
+    for start, end in port_ranges:
+        for port in range(start, end + 1):
+            mask[port >> 3] |= 1 << (port & 7)
+    return mask
+
+
+# 可疑端口位图，模块加载时预计算，查询只需一次字节读取
+_PORT_MASK = _build_port_mask(NetworkFingerprinting.LEECHCORE_SIGNATURES['port_ranges'])
+# 同一块内存的numpy视图，用于批量查询
+_PORT_BITMAP = np.frombuffer(_PORT_MASK, dtype=np.uint8) if _HAVE_NP else None
 
 
 class HistoricalAnalyzer:
     """历史对比分析 - 与基线数据对比"""
     
+    # 历史记录字段（预分配的结构化数组，作为环形缓冲区使用）
+    HISTORY_DTYPE = np.dtype([
+        ('timestamp', 'f8'),
+        ('network_connections', 'i4'),
+        ('process_count', 'i4'),
+        ('memory_usage', 'f8'),
+    ]) if _HAVE_NP else None
+    
     def __init__(self, history_limit=100):
-        self.history = deque(maxlen=history_limit)
+        self.history_limit = history_limit
+        if _HAVE_NP:
+            self.history = np.zeros(history_limit, dtype=self.HISTORY_DTYPE)
+        else:
+            # 无numpy时以定长列表保存(timestamp, network_connections, process_count, memory_usage)元组
+            self.history = [None] * history_limit
+        self._head = 0
+        self._count = 0
         self.baseline = None
     
+    def record_state(self, current_state):
+        """记录一次扫描状态到历史缓冲区"""
+        self.history[self._head] = (
+            datetime.now().timestamp(),
+            current_state.get('network_connections', 0),
+            current_state.get('process_count', 0),
+            current_state.get('memory_usage', 0.0),
+        )
+        self._head = (self._head + 1) % self.history_limit
+        self._count = min(self._count + 1, self.history_limit)
+    
+    def history_mean(self):
+        """计算历史记录的均值，无记录时返回None"""
+        if not self._count:
+            return None
+        
+        if not _HAVE_NP:
+            recent = self.history[:self._count]
+            return {
+                'network_connections': int(round(sum(r[1] for r in recent) / self._count)),
+                'process_count': int(round(sum(r[2] for r in recent) / self._count)),
+                'memory_usage': sum(r[3] for r in recent) / self._count
+            }
+        
+        recent = self.history[:self._count]
+        return {
+            'network_connections': int(round(recent['network_connections'].mean())),
+            'process_count': int(round(recent['process_count'].mean())),
+            'memory_usage': float(recent['memory_usage'].mean())
+        }
+    
     def establish_baseline(self, current_state):
-        """建立基线数据"""
+        """建立基线数据（取历史记录均值，无历史时使用当前状态）"""
+        mean = self.history_mean()
+        if mean is None:
+            mean = dict(current_state)
+            if 'network_connections' not in mean:
+                mean['network_connections'] = len(psutil.net_connections())
+            if 'process_count' not in mean:
+                mean['process_count'] = len(psutil.pids())
+            if 'memory_usage' not in mean:
+                mean['memory_usage'] = psutil.virtual_memory().percent
+        
         self.baseline = {
             'timestamp': datetime.now(),
-            'network_connections': len(psutil.net_connections()),
-            'process_count': len(psutil.pids()),
+            'network_connections': mean['network_connections'],
+            'process_count': mean['process_count'],
             'cpu_usage': psutil.cpu_percent(),
-            'memory_usage': psutil.virtual_memory().percent
+            'memory_usage': mean['memory_usage']
         }
         logger.info("基线数据已建立")
     
@@ -242,6 +433,17 @@ class HistoricalAnalyzer:
 class ComprehensiveDetector:
     """综合检测器 - 整合所有检测模块"""
     
+    # 系统快照中每个进程采集的属性（只取各检测模块实际用到的）
+    SNAPSHOT_ATTRS = ['memory_info']
+    
+    # 各类检测结果的威胁权重（驱动程序问题权重较高）
+    THREAT_WEIGHTS = (
+        ('memory_anomalies', 10),
+        ('driver_issues', 30),
+        ('network_fingerprints', 15),
+        ('baseline_deviations', 10),
+    )
+    
     def __init__(self):
         self.memory_detector = MemoryAnomalyDetector()
         self.driver_analyzer = DriverBehaviorAnalyzer()
@@ -249,6 +451,29 @@ class ComprehensiveDetector:
         self.historical_analyzer = HistoricalAnalyzer()
         self.detection_log = deque(maxlen=1000)
     
+    def _collect_snapshot(self):
+        """一次遍历采集本次扫描所需的系统状态，供各检测模块共享"""
+        try:
+            connections = psutil.net_connections(kind='inet')
+        except Exception as e:
+            logger.error("获取网络连接失败: %s", e)
+            connections = []
+        
+        # process_iter返回全局缓存的Process对象，其info属性会被其他process_iter调用覆盖，
+        # 因此不使用info，而是为每个进程保存一份独立的属性字典
+        procs = []
+        for proc in psutil.process_iter():
+            try:
+                procs.append((proc, proc.as_dict(attrs=self.SNAPSHOT_ATTRS)))
+            except psutil.NoSuchProcess:
+                continue
+        
+        return {
+            'procs': procs,
+            'conns': connections,
+            'memory': psutil.virtual_memory()
+        }
+    
     def comprehensive_scan(self):
         """执行综合扫描"""
         logger.info("\n" + "=" * 60)
@@ -264,46 +489,54 @@ class ComprehensiveDetector:
             'overall_threat_level': 'LOW'
         }
         
-        # 1. 内存异常检测
-        logger.info("\n[高级-1] 检测内存异常...")
-        mem_anomalies = self.memory_detector.detect_memory_access_anomalies()
-        if mem_anomalies:
-            results['memory_anomalies'] = mem_anomalies
-            logger.warning(f"   发现 {len(mem_anomalies)} 个内存异常")
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            # 驱动枚举与进程/连接快照采集互不依赖，放到后台线程并行执行
+            drivers_future = executor.submit(self.driver_analyzer.scan_loaded_drivers)
+            
+            # 每次扫描只遍历一次进程表和连接表
+            snapshot = self._collect_snapshot()
+            
+            # 1. 内存异常检测
+            logger.info("\n[高级-1] 检测内存异常...")
+            mem_anomalies = self.memory_detector.detect_memory_access_anomalies(snapshot)
+            if mem_anomalies:
+                results['memory_anomalies'] = mem_anomalies
+                logger.warning("   发现 %d 个内存异常", len(mem_anomalies))
+            
+            # 2. 驱动程序分析
+            logger.info("[高级-2] 分析驱动程序...")
+            suspicious_drivers = drivers_future.result()
         
-        # 2. 驱动程序分析
-        logger.info("[高级-2] 分析驱动程序...")
-        suspicious_drivers = self.driver_analyzer.scan_loaded_drivers()
         if suspicious_drivers:
             results['driver_issues'] = suspicious_drivers
-            logger.warning(f"   发现 {len(suspicious_drivers)} 个可疑驱动程序")
+            logger.warning("   发现 %d 个可疑驱动程序", len(suspicious_drivers))
         
         # 3. 网络指纹识别
         logger.info("[高级-3] 分析网络指纹...")
         try:
-            connections = psutil.net_connections(kind='inet')
-            for conn in connections:
-                if conn.raddr:
-                    fingerprint = self.network_fingerprinter.analyze_connection_fingerprint(conn)
-                    if fingerprint['indicators']:
-                        results['network_fingerprints'].append({
-                            'connection': {
-                                'local': str(conn.laddr),
-                                'remote': str(conn.raddr)
-                            },
-                            'fingerprint': fingerprint,
-                            'pid': conn.pid
-                        })
+            # 只为命中的连接构建指纹
+            for conn in self.network_fingerprinter.select_candidates(snapshot['conns']):
+                fingerprint = self.network_fingerprinter.analyze_connection_fingerprint(conn)
+                if fingerprint['indicators']:
+                    results['network_fingerprints'].append({
+                        'connection': {
+                            'local': str(conn.laddr),
+                            'remote': str(conn.raddr)
+                        },
+                        'fingerprint': fingerprint,
+                        'pid': conn.pid
+                    })
         except Exception as e:
-            logger.error(f"网络指纹分析失败: {e}")
+            logger.error("网络指纹分析失败: %s", e)
         
         # 4. 历史对比分析
         logger.info("[高级-4] 历史对比分析...")
         current_state = {
-            'network_connections': len(psutil.net_connections()),
-            'process_count': len(psutil.pids()),
-            'memory_usage': psutil.virtual_memory().percent
+            'network_connections': len(snapshot['conns']),
+            'process_count': len(snapshot['procs']),
+            'memory_usage': snapshot['memory'].percent
         }
+        self.historical_analyzer.record_state(current_state)
         
         if self.historical_analyzer.baseline is None:
             self.historical_analyzer.establish_baseline(current_state)
@@ -311,7 +544,7 @@ class ComprehensiveDetector:
             deviations = self.historical_analyzer.compare_with_baseline(current_state)
             if deviations and 'deviation' not in deviations:
                 results['baseline_deviations'] = deviations
-                logger.warning(f"   检测到 {len(deviations)} 个基线偏差")
+                logger.warning("   检测到 %d 个基线偏差", len(deviations))
         
         # 5. 计算威胁等级
         threat_score = self._calculate_threat_score(results)
@@ -324,27 +557,13 @@ class ComprehensiveDetector:
         else:
             results['overall_threat_level'] = 'LOW'
         
-        logger.info(f"\n威胁等级: {results['overall_threat_level']} (得分: {threat_score})")
+        logger.info("\n威胁等级: %s (得分: %d)", results['overall_threat_level'], threat_score)
         
         return results
     
     def _calculate_threat_score(self, results):
-        """计算威胁得分"""
-        score = 0
-        
-        if results['memory_anomalies']:
-            score += len(results['memory_anomalies']) * 10
-        
-        if results['driver_issues']:
-            score += len(results['driver_issues']) * 30  # 驱动程序问题权重较高
-        
-        if results['network_fingerprints']:
-            score += len(results['network_fingerprints']) * 15
-        
-        if results['baseline_deviations']:
-            score += len(results['baseline_deviations']) * 10
-        
-        return min(100, score)
+        """计算威胁得分（各类结果数量的加权和，上限100）"""
+        return min(100, sum(len(results[key]) * weight for key, weight in self.THREAT_WEIGHTS))
 
 
 if __name__ == '__main__':
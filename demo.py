@@ -6,8 +6,18 @@ LeechCore检测系统 - 测试和演示程序
 import logging
 import json
 import sys
+import time
+import traceback
 from datetime import datetime
 
+import psutil
+
+# 导入各个模块
+from leechcore_detector import NetworkMonitor, ProcessMonitor
+from advanced_detector import MemoryAnomalyDetector, DriverBehaviorAnalyzer, ComprehensiveDetector
+from monitoring_system import AlertManager, LogHandler, ArchiveManager
+from main import LeechCoreDetectionSystem
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -22,9 +32,6 @@ def demo_network_monitoring():
     print("演示1: 网络监控")
     print("=" * 70)
     
-    from leechcore_detector import NetworkMonitor
-    import time
-    
     monitor = NetworkMonitor(threshold_mbps=100)
     
     print("\n监控当前网络流量...")
@@ -50,8 +57,6 @@ def demo_process_monitoring():
     print("演示2: 进程监控")
     print("=" * 70)
     
-    from leechcore_detector import ProcessMonitor
-    
     monitor = ProcessMonitor()
     
     print("\n扫描所有运行的进程...")
@@ -82,9 +87,6 @@ def demo_memory_monitoring():
     print("演示3: 内存异常检测")
     print("=" * 70)
     
-    from advanced_detector import MemoryAnomalyDetector
-    import psutil
-    
     detector = MemoryAnomalyDetector()
     
     print("\n分析系统内存状态...\n")
@@ -118,8 +120,6 @@ def demo_driver_analysis():
     print("演示4: 驱动程序分析")
     print("=" * 70)
     
-    from advanced_detector import DriverBehaviorAnalyzer
-    
     print("\n扫描系统驱动程序...")
     drivers = DriverBehaviorAnalyzer.scan_loaded_drivers()
     
@@ -137,8 +137,6 @@ def demo_comprehensive_scan():
     print("演示5: 综合检测")
     print("=" * 70)
     
-    from advanced_detector import ComprehensiveDetector
-    
     detector = ComprehensiveDetector()
     results = detector.comprehensive_scan()
     
@@ -154,8 +152,6 @@ def demo_monitoring_system():
     print("演示6: 监控系统")
     print("=" * 70)
     
-    from monitoring_system import AlertManager, LogHandler, ArchiveManager
-    
     print("\n初始化监控系统组件...")
     
     # 创建警报管理器
@@ -176,6 +172,7 @@ def demo_monitoring_system():
     
     for severity, title, desc in alerts:
         alert = alert_mgr.create_alert(severity, title, desc)
+        alert_mgr.flush()  # 等待日志处理器输出完成，避免与下面的print交错
         print(f"  [{severity}] {title}")
     
     # 显示最近的警报
@@ -196,8 +193,6 @@ def demo_full_system():
     print("演示7: 完整系统运行")
     print("=" * 70)
     
-    from main import LeechCoreDetectionSystem
-    
     print("\n初始化LeechCore检测系统...")
     system = LeechCoreDetectionSystem()
     
@@ -300,5 +295,4 @@ if __name__ == '__main__':
         print("\n\n演示已停止")
     except Exception as e:
         logger.error(f"错误: {e}")
-        import traceback
         traceback.print_exc()
@@ -21,83 +21,114 @@ from collections import defaultdict
 
 import psutil
 
+from monitoring_system import dumps_json
+
 ROOT = os.path.dirname(os.path.abspath(__file__))
 CONFIG_PATH = os.path.join(ROOT, "config.json")
 
+# Windows 服务列表变化不频繁，枚举结果缓存一段时间（秒）
+SERVICE_CACHE_TTL = 30
+_service_cache = None
+_service_cache_ts = 0.0
+
 
 def load_config(path=CONFIG_PATH):
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
 
-def nic_total_bytes(pernic):
-    # pernic: dict from psutil.net_io_counters(pernic=True)
-    total = 0
-    for name, stats in pernic.items():
-        try:
-            total += stats.bytes_sent + stats.bytes_recv
-        except Exception:
-            continue
-    return total
+def nic_total_bytes():
+    # 所有网卡发送+接收的总字节数，由 psutil 一次性汇总
+    stats = psutil.net_io_counters(pernic=False)
+    if stats is None:  # 系统没有网卡时返回 None
+        return 0
+    return stats.bytes_sent + stats.bytes_recv
 
 
-def in_suspicious_port_ranges(port, ranges):
+def build_port_bitmap(ranges):
+    # 每个端口占一个字节，查询时直接按端口号索引
+    bitmap = bytearray(65536)
     for a, b in ranges:
-        if a <= port <= b:
-            return True
-    return False
+        a, b = max(0, a), min(65535, b)
+        if a <= b:
+            bitmap[a:b + 1] = b"\x01" * (b - a + 1)
+    return bitmap
+
+
+def running_services():
+    # 返回带有 pid 的服务信息列表，在 SERVICE_CACHE_TTL 内复用上次的枚举结果
+    global _service_cache, _service_cache_ts
+    now = time.monotonic()
+    if _service_cache is None or now - _service_cache_ts > SERVICE_CACHE_TTL:
+        services = []
+        for svc in psutil.win_service_iter():
+            try:
+                info = svc.as_dict()
+            except Exception:
+                continue
+            if info.get("pid"):
+                services.append(info)
+        _service_cache = services
+        _service_cache_ts = now
+    return _service_cache
 
 
 def analyze_services(cfg, delta_mbps, connections_snapshot=None):
     suspicious = []
     risk_threshold = cfg.get("risk_threshold", 30)
     suspicious_ranges = cfg.get("network_monitoring", {}).get("suspicious_port_ranges", [])
+    port_bitmap = build_port_bitmap(suspicious_ranges)
+    established = psutil.CONN_ESTABLISHED
 
-    for svc in psutil.win_service_iter():
+    # 一次性枚举全部连接并按pid分组，避免逐个服务进程查询连接
+    if connections_snapshot is None:
         try:
-            info = svc.as_dict()
+            connections_snapshot = psutil.net_connections(kind="inet")
         except Exception:
-            continue
-
-        pid = info.get("pid") or 0
-        if not pid:
-            continue
+            connections_snapshot = []
+    conns_by_pid = defaultdict(list)
+    for c in connections_snapshot:
+        conns_by_pid[c.pid].append(c)
+
+    # 当系统带宽非常高时，稍微提升分数
+    bandwidth_bonus = 0
+    if delta_mbps > cfg.get("network_monitoring", {}).get("high_bandwidth_threshold", 100):
+        bandwidth_bonus = 10
+
+    # 没有任何网络连接时，服务分数只有带宽加分；达不到阈值则无需枚举服务
+    if not conns_by_pid and bandwidth_bonus < risk_threshold:
+        return suspicious
 
-        try:
-            p = psutil.Process(pid)
-        except psutil.NoSuchProcess:
+    for info in running_services():
+        pid = info["pid"]
+        conns = conns_by_pid.get(pid)
+        # 没有连接的服务分数只有带宽加分，不足阈值时直接跳过
+        if not conns and bandwidth_bonus < risk_threshold:
             continue
 
-        try:
-            conns = p.connections(kind="inet")
-        except Exception:
-            conns = []
-
         est_count = 0
         remote_addrs = set()
         suspicious_ports = 0
-        for c in conns:
-            if c.raddr:
-                remote_addrs.add(c.raddr.ip)
-                try:
-                    port = c.raddr.port
-                    if in_suspicious_port_ranges(port, suspicious_ranges):
-                        suspicious_ports += 1
-                except Exception:
-                    pass
-            if getattr(c, "status", None) == "ESTABLISHED":
+        for c in conns or ():
+            raddr = c.raddr
+            if raddr:
+                ip, port = raddr
+                remote_addrs.add(ip)
+                if port_bitmap[port]:
+                    suspicious_ports += 1
+            if c.status == established:
                 est_count += 1
 
         # 基于启发式规则计算风险分数
-        score = est_count * 5 + len(remote_addrs) * 3 + suspicious_ports * 10
-        # 当系统带宽非常高时，稍微提升分数
-        if delta_mbps > cfg.get("network_monitoring", {}).get("high_bandwidth_threshold", 100):
-            score += 10
+        score = est_count * 5 + len(remote_addrs) * 3 + suspicious_ports * 10 + bandwidth_bonus
 
         if score >= risk_threshold:
+            # 只为达到风险阈值的服务创建进程对象
             exe = None
             try:
-                exe = p.exe()
+                exe = psutil.Process(pid).exe()
+            except psutil.NoSuchProcess:
+                continue
             except Exception:
                 exe = None
 
@@ -120,16 +151,26 @@ def run_monitor(cfg):
     bw_threshold = cfg.get("bandwidth_threshold_mbps", 100)
 
     print("Starting LeechCore heuristic detector. Press Ctrl-C to stop.")
-    prev = psutil.net_io_counters(pernic=True)
-    prev_total = nic_total_bytes(prev)
+    prev_total = nic_total_bytes()
+    prev_ts = time.monotonic()
+    deadline = prev_ts + interval
 
     try:
         while True:
-            time.sleep(interval)
-            curr = psutil.net_io_counters(pernic=True)
-            curr_total = nic_total_bytes(curr)
+            # 只睡眠到下一个截止时间，扣除本轮检测的耗时，避免采样周期漂移
+            now = time.monotonic()
+            if deadline > now:
+                time.sleep(deadline - now)
+            else:
+                deadline = now  # 检测耗时超过一个周期，从当前时刻重新计时
+            deadline += interval
+
+            curr_total = nic_total_bytes()
+            curr_ts = time.monotonic()
             delta_bytes = max(0, curr_total - prev_total)
-            mbps = (delta_bytes * 8) / (interval * 1024 * 1024)
+            # 使用实际经过的时间计算带宽
+            elapsed = curr_ts - prev_ts
+            mbps = (delta_bytes * 8) / (elapsed * 1024 * 1024) if elapsed > 0 else 0.0
 
             logging.info("Network delta: %.2f Mbps", mbps)
 
@@ -137,6 +178,8 @@ def run_monitor(cfg):
                 logging.warning("High LAN bandwidth detected: %.2f Mbps (threshold %.2f)", mbps, bw_threshold)
                 suspicious = analyze_services(cfg, mbps)
                 if suspicious:
+                    # 本轮的全部告警合并为一条日志和一次输出
+                    lines = []
                     for s in suspicious:
                         msg = (
                             f"Suspicious service detected: {s['service_name']} (PID {s['pid']})",
@@ -146,13 +189,15 @@ def run_monitor(cfg):
                             f"Suspicious remote ports: {s['suspicious_remote_ports']}",
                             f"Risk score: {s['risk_score']}",
                         )
-                        logging.warning("%s", " | ".join(msg))
-                        print("ALERT:")
-                        print(" | ".join(msg))
+                        lines.append(" | ".join(msg))
+                    report = "\n".join(lines)
+                    logging.warning("Suspicious services found (%d):\n%s", len(lines), report)
+                    print("ALERT:\n" + report)
                 else:
                     logging.info("No suspicious services found in this interval.")
 
             prev_total = curr_total
+            prev_ts = curr_ts
 
     except KeyboardInterrupt:
         print("Detector stopped by user.")
@@ -161,19 +206,19 @@ def run_monitor(cfg):
 def run_once(cfg):
     # 单次检测，便于调试
     interval = cfg.get("detection_interval", 5)
-    prev = psutil.net_io_counters(pernic=True)
-    prev_total = nic_total_bytes(prev)
+    prev_total = nic_total_bytes()
+    prev_ts = time.monotonic()
     time.sleep(interval)
-    curr = psutil.net_io_counters(pernic=True)
-    curr_total = nic_total_bytes(curr)
+    curr_total = nic_total_bytes()
+    elapsed = time.monotonic() - prev_ts
     delta_bytes = max(0, curr_total - prev_total)
-    mbps = (delta_bytes * 8) / (interval * 1024 * 1024)
+    mbps = (delta_bytes * 8) / (elapsed * 1024 * 1024)
     print(f"Measured bandwidth: {mbps:.2f} Mbps")
     suspicious = analyze_services(cfg, mbps)
     if suspicious:
         print("Suspicious services:")
         for s in suspicious:
-            print(json.dumps(s, ensure_ascii=False, indent=2))
+            print(dumps_json(s, indent=True))
     else:
         print("No suspicious services found.")
 
@@ -212,24 +257,25 @@ LeechCore/MemProcFS 作弊检测程序
 """
 
 import psutil
+import ipaddress
 import socket
-import subprocess
 import json
 import time
 from datetime import datetime, timedelta
 from collections import defaultdict, deque
+from functools import lru_cache
 from threading import Thread, Lock
 import logging
+import re
+
+try:
+    import numpy as np
+    _HAVE_NP = True
+except ImportError:
+    # numpy为可选依赖，缺失时使用纯Python实现
+    np = None
+    _HAVE_NP = False
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('leechcore_detection.log'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
 
@@ -246,7 +292,14 @@ class NetworkMonitor:
         """
         self.threshold_mbps = threshold_mbps
         self.window_size = window_size
-        self.bandwidth_history = deque(maxlen=window_size)
+        # 预分配的带宽环形缓冲区，_head为下一个写入位置，_count为有效样本数
+        if _HAVE_NP:
+            self.bandwidth_history = np.zeros(window_size, dtype=np.float32)
+        else:
+            self.bandwidth_history = [0.0] * window_size
+        self._head = 0
+        self._count = 0
+        self._bandwidth_sum = 0.0  # 无numpy时窗口内样本的累计和，随写入增量更新
         self.last_stats = None
         self.lock = Lock()
         self.suspicious_ips = defaultdict(int)
@@ -258,7 +311,7 @@ class NetworkMonitor:
             return {
                 'bytes_sent': net_io.bytes_sent,
                 'bytes_recv': net_io.bytes_recv,
-                'timestamp': time.time()
+                'timestamp': time.monotonic()
             }
         except Exception as e:
             logger.error(f"获取网络统计失败: {e}")
@@ -287,10 +340,8 @@ class NetworkMonitor:
         """分析带宽异常"""
         bandwidth = self.calculate_bandwidth()
         
-        with self.lock:
-            self.bandwidth_history.append(bandwidth)
-        
-        avg_bandwidth = sum(self.bandwidth_history) / len(self.bandwidth_history) if self.bandwidth_history else 0
+        # 带宽样本只由检测线程写入，无需加锁
+        avg_bandwidth = self._record_bandwidth(bandwidth)
         
         if bandwidth > self.threshold_mbps:
             logger.warning(f"🚨 检测到异常带宽: {bandwidth:.2f} MB/s (阈值: {self.threshold_mbps} MB/s)")
@@ -298,6 +349,22 @@ class NetworkMonitor:
         
         return False, bandwidth
     
+    def _record_bandwidth(self, bandwidth):
+        """写入一个带宽样本到环形缓冲区，返回窗口内的平均带宽"""
+        if not _HAVE_NP and self._count == self.window_size:
+            # 窗口已满时减去即将被覆盖的最旧样本
+            self._bandwidth_sum -= self.bandwidth_history[self._head]
+        
+        self.bandwidth_history[self._head] = bandwidth
+        self._head = (self._head + 1) % self.window_size
+        self._count = min(self._count + 1, self.window_size)
+        
+        if _HAVE_NP:
+            return float(self.bandwidth_history[:self._count].mean())
+        
+        self._bandwidth_sum += bandwidth
+        return self._bandwidth_sum / self._count
+    
     def get_active_connections(self):
         """获取所有活跃的网络连接"""
         try:
@@ -311,6 +378,7 @@ class NetworkMonitor:
         """检测可疑的网络通讯"""
         connections = self.get_active_connections()
         suspicious = []
+        hit_ips = []
         
         for conn in connections:
             if conn.raddr:  # 有远程地址
@@ -327,9 +395,13 @@ class NetworkMonitor:
                         'pid': conn.pid,
                         'type': conn.type
                     })
-                    
-                    with self.lock:
-                        self.suspicious_ips[remote_ip] += 1
+                    hit_ips.append(remote_ip)
+        
+        # 计数在本地收集，扫描结束后一次性合并，每次扫描只加锁一次
+        if hit_ips:
+            with self.lock:
+                for ip in hit_ips:
+                    self.suspicious_ips[ip] += 1
         
         return suspicious
     
@@ -343,39 +415,32 @@ class NetworkMonitor:
                 return True
             
             # 检测到副机的连接（通常局域网IP）
-            remote_ip = conn.raddr[0]
-            if self._is_lan_ip(remote_ip) and conn.status == 'ESTABLISHED':
-                # 本地网络连接且建立状态 - 需要进一步确认
-                if self._is_high_bandwidth_connection(conn):
-                    return True
+            # 本地网络连接、已建立且能关联到进程
+            if conn.status == 'ESTABLISHED' and conn.pid and self._is_lan_ip(conn.raddr[0]):
+                return True
         
         return False
     
     def _is_lan_ip(self, ip):
         """检测是否为局域网IP"""
-        lan_ranges = [
-            ('10.', '10.255.'),
-            ('172.16.', '172.31.'),
-            ('192.168.', '192.168.'),
-            ('127.', '127.')
-        ]
-        
-        for start, end in lan_ranges:
-            if ip.startswith(start[:ip.rfind('.')]):
-                return True
-        
-        return False
-    
-    def _is_high_bandwidth_connection(self, conn):
-        """检测连接是否为高带宽连接"""
-        try:
-            if conn.pid:
-                proc = psutil.Process(conn.pid)
-                # 后续可通过进程统计信息判断
-                return True
-        except:
-            pass
+        return _is_lan_address(ip)
+
+
+# 局域网及回环网段
+LAN_NETWORKS = tuple(
+    ipaddress.ip_network(net)
+    for net in ('10.0.0.0/8', '172.16.0.0/12', '192.168.0.0/16', '127.0.0.0/8')
+)
+
+
+@lru_cache(maxsize=4096)
+def _is_lan_address(ip):
+    """判断IP是否属于局域网网段（同一远程地址会在多次扫描中重复出现，结果缓存）"""
+    try:
+        addr = ipaddress.ip_address(ip)
+    except ValueError:
         return False
+    return any(addr in net for net in LAN_NETWORKS)
 
 
 class ProcessMonitor:
@@ -397,6 +462,9 @@ class ProcessMonitor:
         'direct_access',
     ]
     
+    # 用于精确匹配进程基本名（不含扩展名）的特征集合
+    SUSPICIOUS_NAMES = frozenset(SUSPICIOUS_PATTERNS)
+    
     # 可疑的命令行参数
     SUSPICIOUS_CMDLINE_PATTERNS = [
         'leechcore',
@@ -411,6 +479,9 @@ class ProcessMonitor:
         self.known_services = set()
         self.suspicious_processes = []
         self.lock = Lock()
+        # 将特征列表合并为单个忽略大小写的正则，一次扫描匹配全部特征
+        self._name_re = re.compile('|'.join(map(re.escape, self.SUSPICIOUS_PATTERNS)), re.IGNORECASE)
+        self._cmdline_re = re.compile('|'.join(map(re.escape, self.SUSPICIOUS_CMDLINE_PATTERNS)), re.IGNORECASE)
         self._load_known_services()
     
     def _load_known_services(self):
@@ -429,22 +500,19 @@ class ProcessMonitor:
         
         try:
             for proc in psutil.process_iter(['pid', 'name', 'cmdline', 'status']):
-                try:
-                    proc_info = proc.as_dict(attrs=['pid', 'name', 'cmdline', 'status'])
-                    
-                    # 检查进程名称
-                    if self._check_process_name(proc_info['name']):
-                        suspicious.append(proc_info)
-                        logger.warning(f"🚨 检测到可疑进程（名称）: {proc_info['name']} (PID: {proc_info['pid']})")
-                    
-                    # 检查命令行参数
-                    if proc_info['cmdline'] and self._check_cmdline(proc_info['cmdline']):
-                        suspicious.append(proc_info)
-                        logger.warning(f"🚨 检测到可疑进程（命令行）: {proc_info['name']} (PID: {proc_info['pid']})")
-                        logger.info(f"   命令行: {' '.join(proc_info['cmdline'])}")
+                # process_iter已预取所需属性，无权限读取的属性为None
+                proc_info = proc.info
                 
-                except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                    pass
+                # 检查进程名称
+                if proc_info['name'] and self._check_process_name(proc_info['name']):
+                    suspicious.append(proc_info)
+                    logger.warning(f"🚨 检测到可疑进程（名称）: {proc_info['name']} (PID: {proc_info['pid']})")
+                
+                # 检查命令行参数（名称已命中的进程不重复记录）
+                elif proc_info['cmdline'] and self._check_cmdline(proc_info['cmdline']):
+                    suspicious.append(proc_info)
+                    logger.warning(f"🚨 检测到可疑进程（命令行）: {proc_info['name']} (PID: {proc_info['pid']})")
+                    logger.info(f"   命令行: {' '.join(proc_info['cmdline'])}")
         
         except Exception as e:
             logger.error(f"扫描进程失败: {e}")
@@ -458,10 +526,11 @@ class ProcessMonitor:
         """检查进程名称是否可疑"""
         name_lower = name.lower()
         
-        # 检查黑名单
-        for pattern in self.SUSPICIOUS_PATTERNS:
-            if pattern in name_lower:
-                return True
+        # 基本名与特征完全一致时直接命中，否则再做子串匹配
+        if name_lower.rsplit('.', 1)[0] in self.SUSPICIOUS_NAMES:
+            return True
+        if self._name_re.search(name_lower):
+            return True
         
         # 检查是否为已知安全的进程
         if name_lower.split('.')[0] in self.known_services:
@@ -471,23 +540,21 @@ class ProcessMonitor:
     
     def _check_cmdline(self, cmdline):
         """检查命令行参数是否可疑"""
-        cmdline_str = ' '.join(cmdline).lower()
-        
-        for pattern in self.SUSPICIOUS_CMDLINE_PATTERNS:
-            if pattern in cmdline_str:
-                return True
-        
-        return False
+        # 逐个参数匹配，命中即返回，无需拼接整条命令行（特征均不含空格）
+        search = self._cmdline_re.search
+        return any(search(arg) for arg in cmdline)
     
     def get_process_network_usage(self, pid):
         """获取特定进程的网络使用情况"""
         try:
             proc = psutil.Process(pid)
-            connections = proc.net_connections()
+            with proc.oneshot():
+                connections = proc.net_connections()
+                name = proc.name()
             
             network_info = {
                 'pid': pid,
-                'name': proc.name(),
+                'name': name,
                 'connection_count': len(connections),
                 'connections': []
             }
@@ -511,24 +578,12 @@ class ProcessMonitor:
         suspicious_services = []
         
         try:
-            # 在Windows上使用wmic获取服务信息
-            result = subprocess.run(
-                ['wmic', 'service', 'list', 'brief'],
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
-            
-            if result.returncode == 0:
-                lines = result.stdout.strip().split('\n')
-                for line in lines[1:]:  # 跳过标题行
-                    if line.strip():
-                        parts = line.split()
-                        if len(parts) >= 2:
-                            service_name = parts[0]
-                            if self._check_process_name(service_name):
-                                suspicious_services.append(service_name)
-                                logger.warning(f"🚨 检测到可疑Windows服务: {service_name}")
+            # 通过psutil枚举Windows服务
+            for svc in psutil.win_service_iter():
+                service_name = svc.name()
+                if self._check_process_name(service_name):
+                    suspicious_services.append(service_name)
+                    logger.warning(f"🚨 检测到可疑Windows服务: {service_name}")
         
         except Exception as e:
             logger.error(f"检查Windows服务失败: {e}")
@@ -641,11 +696,12 @@ class AnomalyDetector:
         """持续监控"""
         logger.info(f"启动持续监控 (间隔: {interval}秒)")
         
-        start_time = time.time()
+        start_time = time.monotonic()
+        deadline = start_time
         
         try:
             while True:
-                if duration and (time.time() - start_time) > duration:
+                if duration and (time.monotonic() - start_time) > duration:
                     break
                 
                 results = self.run_detection()
@@ -654,8 +710,14 @@ class AnomalyDetector:
                 if results['alert']:
                     self._save_alert(results)
                 
-                logger.info(f"下次检测倒计时: {interval}秒\n")
-                time.sleep(interval)
+                # 按固定周期调度，扣除本轮检测的耗时
+                deadline += interval
+                sleep_for = deadline - time.monotonic()
+                if sleep_for <= 0:
+                    deadline = time.monotonic()
+                    sleep_for = 0
+                logger.info(f"下次检测倒计时: {sleep_for:.1f}秒\n")
+                time.sleep(sleep_for)
         
         except KeyboardInterrupt:
             logger.info("\n监控已停止")
@@ -665,7 +727,7 @@ class AnomalyDetector:
         try:
             filename = f"alert_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
             with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(results, f, indent=2, ensure_ascii=False)
+                f.write(dumps_json(results, indent=True))
             logger.info(f"警报已保存到: {filename}")
         except Exception as e:
             logger.error(f"保存警报失败: {e}")
@@ -673,6 +735,16 @@ class AnomalyDetector:
 
 def main():
     """主函数"""
+    # 配置日志（仅作为脚本运行时，被导入时由调用方配置）
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('leechcore_detection.log'),
+            logging.StreamHandler()
+        ]
+    )
+    
     detector = AnomalyDetector()
     
     # 运行一次完整检测
@@ -682,7 +754,7 @@ def main():
     print("\n" + "=" * 60)
     print("检测结果摘要")
     print("=" * 60)
-    print(json.dumps(results, indent=2, ensure_ascii=False, default=str))
+    print(dumps_json(results, indent=True))
     print("=" * 60)
     
     # 可选：启动持续监控
@@ -5,14 +5,19 @@ LeechCore检测系统 - 主程序
 
 import logging
 import json
+import platform
 import sys
+import traceback
 from pathlib import Path
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import psutil
 
 # 导入各个模块
 from leechcore_detector import AnomalyDetector
 from advanced_detector import ComprehensiveDetector
-from monitoring_system import RealtimeMonitor, MonitoringDashboard, AlertManager, ArchiveManager
+from monitoring_system import RealtimeMonitor, MonitoringDashboard, AlertManager, ArchiveManager, dump_json, loads_json
 
 
 class LeechCoreDetectionSystem:
@@ -27,6 +32,7 @@ class LeechCoreDetectionSystem:
             detection_interval=self.config['detection_interval']
         )
         self.dashboard = MonitoringDashboard(self.monitor)
+        self._system_info = None  # 系统信息在运行期间不变，首次生成报告时获取
     
     def _load_config(self, config_file):
         """加载配置文件"""
@@ -51,9 +57,8 @@ class LeechCoreDetectionSystem:
         
         try:
             if Path(config_file).exists():
-                with open(config_file, 'r', encoding='utf-8') as f:
-                    user_config = json.load(f)
-                    default_config.update(user_config)
+                user_config = loads_json(Path(config_file).read_bytes())
+                default_config.update(user_config)
                 logging.getLogger(__name__).info(f"已加载配置: {config_file}")
         except Exception as e:
             logging.getLogger(__name__).warning(f"配置加载失败: {e}，使用默认配置")
@@ -85,13 +90,18 @@ class LeechCoreDetectionSystem:
         logger.info("执行快速扫描")
         logger.info("=" * 70)
         
-        # 运行基础检测
-        results = self.basic_detector.run_detection()
-        
-        # 运行高级检测（如果启用）
-        if self.config['enable_advanced_detection']:
-            advanced_results = self.advanced_detector.comprehensive_scan()
-            results['advanced_detection'] = advanced_results
+        # 基础检测与高级检测（如果启用）互不依赖，并行执行
+        # 高级检测的进程快照保存独立的属性副本，不读取被process_iter共享的Process.info
+        # 注意：两个检测器同时运行，各自的步骤日志会交错输出
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            basic_future = executor.submit(self.basic_detector.run_detection)
+            advanced_future = None
+            if self.config['enable_advanced_detection']:
+                advanced_future = executor.submit(self.advanced_detector.comprehensive_scan)
+            
+            results = basic_future.result()
+            if advanced_future is not None:
+                results['advanced_detection'] = advanced_future.result()
         
         # 存档结果
         if self.config['archive_enabled']:
@@ -111,11 +121,14 @@ class LeechCoreDetectionSystem:
         )
         
         try:
-            # 显示仪表板
-            while self.monitor.is_running:
-                import time
-                time.sleep(30)
-                self.dashboard.print_dashboard()
+            # 每30秒显示一次仪表板，监控结束时立即退出
+            # 按1秒分段等待：Python 3.14之前，Windows上的Event.wait无法被Ctrl+C中断
+            waited = 0
+            while not self.monitor.wait_finished(1):
+                waited += 1
+                if waited >= 30:
+                    self.dashboard.print_dashboard()
+                    waited = 0
         
         except KeyboardInterrupt:
             logger.info("用户中断监控")
@@ -126,18 +139,22 @@ class LeechCoreDetectionSystem:
         """生成检测报告"""
         report = {
             'timestamp': datetime.now().isoformat(),
-            'system_info': self._get_system_info(),
+            'system_info': self.system_info,
             'scan_results': scan_results,
             'recommendations': self._get_recommendations(scan_results)
         }
         
         return report
     
+    @property
+    def system_info(self):
+        """系统信息（缓存）"""
+        if self._system_info is None:
+            self._system_info = self._get_system_info()
+        return self._system_info
+    
     def _get_system_info(self):
         """获取系统信息"""
-        import psutil
-        import platform
-        
         return {
             'platform': platform.system(),
             'platform_release': platform.release(),
@@ -182,7 +199,8 @@ class LeechCoreDetectionSystem:
             print(f"  {key}: {value}")
         
         print("\n检测结果:")
-        print(json.dumps(report['scan_results'], indent=2, ensure_ascii=False, default=str))
+        dump_json(report['scan_results'], sys.stdout, indent=True)
+        sys.stdout.write('\n')
         
         print("\n建议:")
         for rec in report['recommendations']:
@@ -274,5 +292,4 @@ if __name__ == '__main__':
         print("\n\n程序已终止")
     except Exception as e:
         print(f"\n错误: {e}")
-        import traceback
         traceback.print_exc()
@@ -6,10 +6,17 @@ LeechCore实时监控和报警系统
 - 事件档案记录
 """
 
+import atexit
+import heapq
+import itertools
 import json
+import os
+import queue
+import sys
 import time
 from datetime import datetime, timedelta
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
 import logging
 import threading
 from pathlib import Path
@@ -17,8 +24,163 @@ import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
+try:
+    import orjson
+except ImportError:
+    # orjson为可选依赖，缺失时使用标准库json
+    orjson = None
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+except ImportError:
+    # 仅Webhook通知需要requests
+    requests = None
+
 logger = logging.getLogger(__name__)
 
+# Webhook通知复用的HTTP会话，首次发送时创建
+_webhook_session = None
+
+# 超过该长度的列表逐项序列化写出，避免一次性生成巨大的JSON字符串
+JSON_CHUNK_ITEMS = 256
+
+
+def _json_default(obj):
+    """orjson无法直接序列化的对象：namedtuple（如连接地址）转为列表，其余转为字符串"""
+    if isinstance(obj, tuple):
+        return list(obj)
+    return str(obj)
+
+
+def dumps_json(obj, indent=False):
+    """将对象序列化为JSON字符串，优先使用orjson
+    
+    Args:
+        obj: 要序列化的对象
+        indent: 是否使用两格缩进，否则输出紧凑格式
+    """
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=_json_default, option=option).decode('utf-8')
+    
+    if indent:
+        return json.dumps(obj, indent=2, ensure_ascii=False, default=str)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+def loads_json(data):
+    """解析JSON（bytes或str），优先使用orjson"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _get_webhook_session():
+    """获取Webhook会话，连接池在多次通知之间复用（保持长连接，避免重复TCP/TLS握手）"""
+    global _webhook_session
+    if _webhook_session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers['Content-Type'] = 'application/json'
+        _webhook_session = session
+    return _webhook_session
+
+
+def _mark_large_containers(obj, marked):
+    """自底向上遍历一次，将包含大列表（超过JSON_CHUNK_ITEMS项）的dict/list的id记入marked
+    
+    Returns:
+        obj本身是否包含大列表
+    """
+    if isinstance(obj, dict):
+        children = obj.values()
+        large = False
+    else:
+        children = obj
+        large = len(obj) > JSON_CHUNK_ITEMS
+    
+    for child in children:
+        if isinstance(child, (dict, list)) and _mark_large_containers(child, marked):
+            large = True
+    
+    if large:
+        marked.add(id(obj))
+    return large
+
+
+def _is_small_flat(obj):
+    """对象是否为标量，或不超过JSON_CHUNK_ITEMS项且不含嵌套容器的dict/list"""
+    if not isinstance(obj, (dict, list)):
+        return True
+    if len(obj) > JSON_CHUNK_ITEMS:
+        return False
+    values = obj.values() if isinstance(obj, dict) else obj
+    return not any(isinstance(v, (dict, list)) for v in values)
+
+
+def _write_json_chunked(obj, fp, indent, marked, level=0):
+    """逐层写出JSON：不含大列表的部分整体序列化，含大列表的容器（id在marked中）逐个元素序列化写出"""
+    if id(obj) not in marked:
+        text = dumps_json(obj, indent=indent)
+        if indent and level:
+            text = text.replace('\n', '\n' + '  ' * level)
+        fp.write(text)
+        return
+    
+    if isinstance(obj, dict):
+        key_sep = ': ' if indent else ':'
+        items = ((dumps_json(str(k)) + key_sep, v) for k, v in obj.items())
+        start, end = '{', '}'
+    else:
+        items = (('', v) for v in obj)
+        start, end = '[', ']'
+    
+    if indent:
+        sep = ',\n' + '  ' * (level + 1)
+        fp.write(start + '\n' + '  ' * (level + 1))
+    else:
+        sep = ','
+        fp.write(start)
+    
+    for i, (prefix, value) in enumerate(items):
+        if i:
+            fp.write(sep)
+        fp.write(prefix)
+        _write_json_chunked(value, fp, indent, marked, level + 1)
+    
+    if indent:
+        fp.write('\n' + '  ' * level)
+    fp.write(end)
+
+
+def dump_json(obj, fp, indent=False):
+    """将对象序列化后写入文本流
+    
+    使用orjson时，包含大列表（超过JSON_CHUNK_ITEMS项）的对象按元素分块写出，其余一次性生成后写入；
+    使用标准库json时边序列化边写入，不构造完整字符串。
+    
+    Args:
+        obj: 要序列化的对象
+        fp: 文本模式的文件对象（如sys.stdout）
+        indent: 是否使用两格缩进
+    """
+    if orjson is not None:
+        marked = set()
+        # 较小的扁平对象不可能包含大列表，无需遍历
+        if _is_small_flat(obj) or not _mark_large_containers(obj, marked):
+            fp.write(dumps_json(obj, indent=indent))
+        else:
+            _write_json_chunked(obj, fp, indent, marked)
+    elif indent:
+        json.dump(obj, fp, indent=2, ensure_ascii=False, default=str)
+    else:
+        json.dump(obj, fp, ensure_ascii=False, separators=(',', ':'), default=str)
+
 
 class AlertManager:
     """警报管理器"""
@@ -30,20 +192,35 @@ class AlertManager:
         'CRITICAL': 2
     }
     
+    # 每个处理器最多积压的警报数，超出时丢弃新警报，避免警报风暴时队列无限增长
+    HANDLER_QUEUE_SIZE = 256
+    
     def __init__(self, max_alerts=1000):
         self.alerts = deque(maxlen=max_alerts)
         self.alert_handlers = []
         self.lock = threading.Lock()
+        # 处理器（日志、邮件等）可能执行网络I/O，在后台线程中运行，不阻塞检测线程；
+        # 每个处理器独占一个线程：同一处理器按警报顺序执行，慢处理器不会阻塞其他处理器
+        self._handler_workers = []
+        self._alert_ids = itertools.count()  # 单调递增的警报ID，deque淘汰旧警报后也不会重复
     
     def register_handler(self, handler):
         """注册警报处理器"""
-        self.alert_handlers.append(handler)
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='alert-handler')
+        with self.lock:
+            self.alert_handlers.append(handler)
+            self._handler_workers.append({
+                'handler': handler,
+                'executor': executor,
+                'pending': 0,     # 已提交但未执行完的警报数
+                'last': None      # 最近提交的任务
+            })
     
     def create_alert(self, severity, title, description, data=None):
         """创建警报"""
         alert = {
-            'id': len(self.alerts),
-            'timestamp': datetime.now().isoformat(),
+            'id': next(self._alert_ids),
+            'timestamp': datetime.now().isoformat(timespec='milliseconds'),
             'severity': severity,
             'title': title,
             'description': description,
@@ -54,27 +231,67 @@ class AlertManager:
             self.alerts.append(alert)
         
         # 触发所有处理器
-        for handler in self.alert_handlers:
-            try:
-                handler.handle_alert(alert)
-            except Exception as e:
-                logger.error(f"警报处理失败: {e}")
+        for worker in self._handler_workers:
+            with self.lock:
+                if worker['pending'] >= self.HANDLER_QUEUE_SIZE:
+                    logger.warning(f"警报处理器积压过多，丢弃警报: {alert['title']}")
+                    continue
+                worker['pending'] += 1
+            
+            future = worker['executor'].submit(self._dispatch, worker['handler'], alert)
+            worker['last'] = future
+            future.add_done_callback(lambda _, w=worker: self._handler_done(w))
         
         return alert
     
-    def get_recent_alerts(self, limit=10, severity=None):
-        """获取最近的警报"""
-        alerts = list(self.alerts)
+    def _handler_done(self, worker):
+        """处理器执行完一条警报后减少积压计数"""
+        with self.lock:
+            worker['pending'] -= 1
+    
+    def flush(self, timeout=None):
+        """等待已提交的警报全部处理完成
         
-        if severity:
-            alerts = [a for a in alerts if a['severity'] == severity]
+        Args:
+            timeout: 最长等待秒数，None表示一直等待
+        """
+        pending = [w['last'] for w in self._handler_workers if w['last'] is not None]
+        wait(pending, timeout=timeout)
+    
+    @staticmethod
+    def _dispatch(handler, alert):
+        """在后台线程中执行单个处理器，记录处理失败"""
+        try:
+            handler.handle_alert(alert)
+        except Exception as e:
+            logger.error(f"警报处理失败: {e}")
+    
+    def get_recent_alerts(self, limit=10, severity=None):
+        """获取最近的警报（按时间顺序返回最后limit条）"""
+        # 从最新的警报向前扫描，凑满limit条即停止，无需复制整个队列
+        recent = []
+        with self.lock:
+            for alert in reversed(self.alerts):
+                if severity and alert['severity'] != severity:
+                    continue
+                recent.append(alert)
+                if len(recent) >= limit:
+                    break
         
-        return alerts[-limit:]
+        recent.reverse()
+        return recent
 
 
 class LogHandler:
     """日志处理器"""
     
+    # 警报级别对应的日志级别
+    LOG_LEVELS = {
+        'CRITICAL': logging.CRITICAL,
+        'WARNING': logging.WARNING,
+        'INFO': logging.INFO
+    }
+    
     def __init__(self, log_file='alerts.log'):
         self.log_file = log_file
         self.logger = logging.getLogger('alerts')
@@ -86,45 +303,211 @@ class LogHandler:
     
     def handle_alert(self, alert):
         """处理警报"""
-        msg = f"[{alert['severity']}] {alert['title']}: {alert['description']}"
-        
-        if alert['severity'] == 'CRITICAL':
-            self.logger.critical(msg)
-        elif alert['severity'] == 'WARNING':
-            self.logger.warning(msg)
-        else:
-            self.logger.info(msg)
+        level = self.LOG_LEVELS.get(alert['severity'], logging.INFO)
+        # 延迟格式化，级别被过滤时不拼接消息
+        self.logger.log(level, "[%s] %s: %s", alert['severity'], alert['title'], alert['description'])
 
 
 class ArchiveManager:
     """事件档案管理器"""
     
-    def __init__(self, archive_dir='./detection_archive'):
+    # 事件流文件（JSONL）超过该大小后轮转
+    JSONL_MAX_BYTES = 64 * 1024 * 1024
+    # 每追加多少条事件检查一次文件大小
+    JSONL_CHECK_INTERVAL = 64
+    # 后台写入队列容量，队列满时丢弃最旧的事件
+    WRITE_QUEUE_SIZE = 256
+    # 每写入多少条事件执行一次fsync
+    FSYNC_INTERVAL = 16
+    # 每个分片目录中持久化的事件数文件，避免启动时遍历所有分片
+    COUNT_FILE = '.count'
+    
+    def __init__(self, archive_dir='./detection_archive', legacy_names=False):
+        """
+        Args:
+            archive_dir: 存档目录
+            legacy_names: 为True时使用可读的日期时间文件名（event_YYYYmmdd_HHMMSS_ffffff.json），
+                          默认使用纳秒时间戳文件名（event_<19位纳秒>.json）
+        """
         self.archive_dir = Path(archive_dir)
+        self.legacy_names = legacy_names
         self.archive_dir.mkdir(exist_ok=True)
+        self.jsonl_path = self.archive_dir / 'events.jsonl'
+        # 事件文件按月份存放在 YYYYMM 分片目录中
+        self._shard_name = None
+        self._shard_dir = None
+        self._shard_counts = {}  # 分片名 -> 该分片的事件数
+        # 存档计数在启动时读取一次，之后随写入增量更新
+        self._recent_events = deque(maxlen=10)
+        self._event_count = self._load_existing_events()
+        self._jsonl = None
+        self._jsonl_count = 0  # 本次运行追加的事件数
+        self._write_queue = queue.Queue(maxsize=self.WRITE_QUEUE_SIZE)
+        self._writer_thread = None
+        self._writer_lock = threading.Lock()
+        # 退出时写出队列中剩余的事件（未启动写入线程时为空操作）
+        atexit.register(self.close)
+    
+    @staticmethod
+    def _list_event_files(directory):
+        """列出目录中的事件文件（DirEntry）"""
+        with os.scandir(directory) as it:
+            return [e for e in it
+                    if e.name.startswith('event_') and e.name.endswith('.json')]
+    
+    def _load_existing_events(self):
+        """读取已有事件总数并记录最近的10个事件文件"""
+        with os.scandir(self.archive_dir) as it:
+            shards = sorted(e.name for e in it
+                            if e.is_dir() and len(e.name) == 6 and e.name.isdigit())
+        
+        # 最近的事件只在根目录（分片前的旧文件）和最新的两个分片中查找
+        root_entries = self._list_event_files(self.archive_dir)
+        entries = root_entries + [e for s in shards[-2:]
+                                  for e in self._list_event_files(self.archive_dir / s)]
+        latest = heapq.nlargest(self._recent_events.maxlen, entries,
+                                key=lambda e: e.stat().st_mtime_ns)
+        self._recent_events.extend(Path(e.path) for e in reversed(latest))
+        
+        # 总数为根目录旧文件数加上现存各分片的计数，整月删除的分片不再计入
+        for shard_name in shards:
+            self._shard_counts[shard_name] = self._read_shard_count(shard_name)
+        return len(root_entries) + sum(self._shard_counts.values())
+    
+    def _read_shard_count(self, shard_name):
+        """读取分片的事件数，计数文件缺失或损坏时重新统计该分片"""
+        shard_dir = self.archive_dir / shard_name
+        try:
+            return int((shard_dir / self.COUNT_FILE).read_text(encoding='ascii'))
+        except (OSError, ValueError):
+            count = len(self._list_event_files(shard_dir))
+            self._save_shard_count(shard_name, count)
+            return count
+    
+    def _save_shard_count(self, shard_name, count):
+        """持久化分片的事件数（先写临时文件再替换，避免中断时留下空文件）"""
+        count_path = self.archive_dir / shard_name / self.COUNT_FILE
+        tmp_path = count_path.with_name(self.COUNT_FILE + '.tmp')
+        try:
+            tmp_path.write_text(str(count), encoding='ascii')
+            os.replace(tmp_path, count_path)
+        except OSError as e:
+            logger.warning(f"事件计数保存失败: {e}")
+    
+    def _get_shard_dir(self):
+        """当前月份的分片目录，跨月时自动创建"""
+        shard_name = time.strftime('%Y%m')
+        if shard_name != self._shard_name:
+            self._shard_dir = self.archive_dir / shard_name
+            self._shard_dir.mkdir(exist_ok=True)
+            self._shard_name = shard_name
+        return self._shard_dir
     
     def save_detection_event(self, event_data):
         """保存检测事件"""
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
-        filename = self.archive_dir / f"event_{timestamp}.json"
+        if self.legacy_names:
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        else:
+            timestamp = f"{time.time_ns():019d}"
         
         try:
+            filename = self._get_shard_dir() / f"event_{timestamp}.json"
             with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(event_data, f, indent=2, ensure_ascii=False, default=str)
+                dump_json(event_data, f, indent=True)
+            shard_count = self._shard_counts.get(self._shard_name, 0) + 1
+            self._shard_counts[self._shard_name] = shard_count
+            self._save_shard_count(self._shard_name, shard_count)
+            self._event_count += 1
+            self._recent_events.append(filename)
             logger.info(f"事件已存档: {filename}")
             return filename
         except Exception as e:
             logger.error(f"存档失败: {e}")
             return None
     
+    def save_detection_event_fast(self, event_data):
+        """将检测事件交给后台写入线程，以JSONL格式追加保存，供监控循环使用
+        
+        序列化和磁盘写入都在写入线程中完成，调用方不会被磁盘I/O阻塞。
+        """
+        with self._writer_lock:
+            if self._writer_thread is None:
+                self._writer_thread = threading.Thread(target=self._writer_loop, daemon=True)
+                self._writer_thread.start()
+        
+        while True:
+            try:
+                self._write_queue.put_nowait(event_data)
+                return True
+            except queue.Full:
+                # 队列已满时丢弃最旧的事件
+                try:
+                    self._write_queue.get_nowait()
+                    logger.warning("存档队列已满，丢弃最旧的事件")
+                except queue.Empty:
+                    pass
+    
+    def _writer_loop(self):
+        """后台写入线程：从队列取出事件写入事件流文件，收到None时退出"""
+        while True:
+            event_data = self._write_queue.get()
+            if event_data is None:
+                break
+            
+            try:
+                line = dumps_json(event_data)
+                if self._jsonl is None:
+                    self._jsonl = open(self.jsonl_path, 'a', encoding='utf-8', buffering=1 << 16)
+                
+                self._jsonl.write(line)
+                self._jsonl.write('\n')
+                self._jsonl_count += 1
+                
+                # 每条事件立即写入文件，每FSYNC_INTERVAL条事件fsync落盘一次
+                self._jsonl.flush()
+                if self._jsonl_count % self.FSYNC_INTERVAL == 0:
+                    os.fsync(self._jsonl.fileno())
+                
+                if self._jsonl_count % self.JSONL_CHECK_INTERVAL == 0 and self._jsonl.tell() >= self.JSONL_MAX_BYTES:
+                    self._rotate_jsonl()
+            except Exception as e:
+                logger.error(f"存档失败: {e}")
+    
+    def _rotate_jsonl(self):
+        """将当前事件流文件改名归档，并重新打开新文件（仅在写入线程中调用）"""
+        self._jsonl.close()
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        self.jsonl_path.rename(self.archive_dir / f"events_{timestamp}.jsonl")
+        self._jsonl = open(self.jsonl_path, 'a', encoding='utf-8', buffering=1 << 16)
+        logger.info(f"事件流文件已轮转: events_{timestamp}.jsonl")
+    
+    def close(self):
+        """停止后台写入线程，写出队列中剩余的事件并关闭事件流文件"""
+        with self._writer_lock:
+            thread, self._writer_thread = self._writer_thread, None
+        
+        if thread is not None:
+            self._write_queue.put(None)
+            thread.join()
+        
+        if self._jsonl is not None:
+            self._jsonl.flush()
+            os.fsync(self._jsonl.fileno())
+            self._jsonl.close()
+            self._jsonl = None
+    
     def get_statistics(self):
-        """获取存档统计"""
-        events = list(self.archive_dir.glob('event_*.json'))
+        """获取存档统计
         
+        total_events、latest_event、event_files只统计单独存档的事件文件（由各分片的计数文件跨运行持久化）；
+        监控循环追加到events.jsonl的事件单独计入streamed_events（仅本次运行）。
+        """
         stats = {
-            'total_events': len(events),
-            'latest_event': events[-1] if events else None,
-            'event_files': [str(e) for e in events[-10:]]  # 最近10个
+            'total_events': self._event_count,
+            'streamed_events': self._jsonl_count,
+            'stream_file': str(self.jsonl_path),
+            'latest_event': self._recent_events[-1] if self._recent_events else None,
+            'event_files': [str(e) for e in self._recent_events]  # 最近10个
         }
         
         return stats
@@ -140,6 +523,8 @@ class RealtimeMonitor:
         self.log_handler = LogHandler()
         self.is_running = False
         self.detection_thread = None
+        self._stop_event = threading.Event()      # 请求停止监控
+        self._finished_event = threading.Event()  # 监控循环已结束
         
         # 注册处理器
         self.alert_manager.register_handler(self.log_handler)
@@ -149,6 +534,8 @@ class RealtimeMonitor:
         logger.info("启动实时监控服务...")
         
         self.is_running = True
+        self._stop_event.clear()
+        self._finished_event.clear()
         self.detection_thread = threading.Thread(
             target=self._monitoring_loop,
             args=(detector, duration),
@@ -159,10 +546,23 @@ class RealtimeMonitor:
     def stop_monitoring(self):
         """停止监控"""
         self.is_running = False
+        self._stop_event.set()
         if self.detection_thread:
             self.detection_thread.join(timeout=5)
+        self.archive_manager.close()
         logger.info("实时监控已停止")
     
+    def wait_finished(self, timeout=None):
+        """等待监控循环结束
+        
+        Args:
+            timeout: 最长等待秒数，None表示一直等待
+        
+        Returns:
+            监控循环是否已结束
+        """
+        return self._finished_event.wait(timeout)
+    
     def _monitoring_loop(self, detector, duration):
         """监控循环"""
         start_time = time.time()
@@ -170,7 +570,7 @@ class RealtimeMonitor:
         alert_cooldown = 30  # 30秒冷却期
         
         try:
-            while self.is_running:
+            while not self._stop_event.is_set():
                 if duration and (time.time() - start_time) > duration:
                     break
                 
@@ -187,7 +587,7 @@ class RealtimeMonitor:
                     
                     # 存档重要事件
                     if results.get('risk_level', 0) > 50:
-                        self.archive_manager.save_detection_event(results)
+                        self.archive_manager.save_detection_event_fast(results)
                     
                 except Exception as e:
                     logger.error(f"检测循环出错: {e}")
@@ -197,18 +597,27 @@ class RealtimeMonitor:
                         str(e)
                     )
                 
-                time.sleep(self.detection_interval)
+                # 等待下一轮检测，收到停止请求时立即退出
+                if self._stop_event.wait(self.detection_interval):
+                    break
         
         except Exception as e:
             logger.error(f"监控线程出错: {e}")
+        finally:
+            self.is_running = False
+            self._finished_event.set()
     
     def _process_detection_results(self, results, last_alert_time, cooldown):
         """处理检测结果"""
         risk_level = results.get('risk_level', 0)
+        if risk_level <= 50:
+            # 常见的低风险结果无需生成警报
+            return
         
         if risk_level > 70:
             # 严重威胁
-            if time.time() - last_alert_time > cooldown:
+            now = time.time()
+            if now - last_alert_time > cooldown:
                 self.alert_manager.create_alert(
                     'CRITICAL',
                     '检测到高风险LeechCore作弊行为',
@@ -216,7 +625,7 @@ class RealtimeMonitor:
                     results
                 )
         
-        elif risk_level > 50:
+        else:
             # 中等威胁
             self.alert_manager.create_alert(
                 'WARNING',
@@ -254,13 +663,14 @@ class NotificationManager:
 描述: {alert_data['description']}
 
 详细数据:
-{json.dumps(alert_data['data'], indent=2, ensure_ascii=False)}
+{dumps_json(alert_data['data'], indent=True)}
             """
             
             msg.attach(MIMEText(body, 'plain', 'utf-8'))
             
             # 发送邮件
-            with smtplib.SMTP(email_config['smtp_server'], email_config['smtp_port']) as server:
+            with smtplib.SMTP(email_config['smtp_server'], email_config['smtp_port'],
+                              timeout=email_config.get('timeout', 10)) as server:
                 server.starttls()
                 server.login(email_config['username'], email_config['password'])
                 server.send_message(msg)
@@ -273,7 +683,9 @@ class NotificationManager:
     @staticmethod
     def send_webhook_alert(alert_data, webhook_url):
         """发送Webhook通知"""
-        import requests
+        if requests is None:
+            logger.error("Webhook通知失败: 未安装requests")
+            return
         
         try:
             payload = {
@@ -283,7 +695,11 @@ class NotificationManager:
                 'description': alert_data['description']
             }
             
-            response = requests.post(webhook_url, json=payload, timeout=5)
+            response = _get_webhook_session().post(
+                webhook_url,
+                data=dumps_json(payload).encode('utf-8'),
+                timeout=5
+            )
             if response.status_code == 200:
                 logger.info(f"Webhook通知已发送")
             else:
@@ -296,6 +712,12 @@ class NotificationManager:
 class MonitoringDashboard:
     """监控仪表板 - 提供实时监控统计"""
     
+    SEVERITY_ICONS = {
+        'CRITICAL': '🚨',
+        'WARNING': '⚠️',
+        'INFO': 'ℹ️'
+    }
+    
     def __init__(self, monitor):
         self.monitor = monitor
     
@@ -318,27 +740,31 @@ class MonitoringDashboard:
         """打印仪表板"""
         data = self.get_dashboard_data()
         
-        print("\n" + "=" * 70)
-        print("                    LeechCore检测监控仪表板")
-        print("=" * 70)
-        print(f"监控状态: {'🟢 运行中' if data['monitoring_active'] else '🔴 已停止'}")
-        print(f"严重警报: {data['critical_alerts_count']}")
-        print(f"最近警报数: {len(data['recent_alerts'])}")
-        print(f"存档事件: {data['archive_statistics'].get('total_events', 0)}")
-        print("=" * 70)
+        # 先拼接完整内容再一次性写出，避免与其他线程的输出交错
+        lines = [
+            "",
+            "=" * 70,
+            "                    LeechCore检测监控仪表板",
+            "=" * 70,
+            f"监控状态: {'🟢 运行中' if data['monitoring_active'] else '🔴 已停止'}",
+            f"严重警报: {data['critical_alerts_count']}",
+            f"最近警报数: {len(data['recent_alerts'])}",
+            f"存档事件: {data['archive_statistics'].get('total_events', 0)}",
+            f"本次监控存档: {data['archive_statistics'].get('streamed_events', 0)}",
+            "=" * 70,
+        ]
         
         if data['recent_alerts']:
-            print("\n最近警报:")
+            lines.append("\n最近警报:")
             for alert in data['recent_alerts'][-5:]:
-                severity_icon = {
-                    'CRITICAL': '🚨',
-                    'WARNING': '⚠️',
-                    'INFO': 'ℹ️'
-                }.get(alert['severity'], '•')
+                severity_icon = self.SEVERITY_ICONS.get(alert['severity'], '•')
                 
-                print(f"{severity_icon} [{alert['severity']}] {alert['title']}")
-                print(f"   {alert['description']}")
-                print(f"   时间: {alert['timestamp']}\n")
+                lines.append(f"{severity_icon} [{alert['severity']}] {alert['title']}")
+                lines.append(f"   {alert['description']}")
+                lines.append(f"   时间: {alert['timestamp']}\n")
+        
+        sys.stdout.write("\n".join(lines) + "\n")
+        sys.stdout.flush()
 
 
 if __name__ == '__main__':